@@ -1,10 +1,18 @@
 import os
 import re
 import asyncio
+import atexit
+import functools
+import multiprocessing
 import time
 import random
 import math
+from collections import OrderedDict, deque
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from dataclasses import dataclass, field
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
 from typing import Optional, List, Tuple, Literal
 
 import discord
@@ -13,14 +21,18 @@ from discord.ext import commands
 
 # --- Third-party helpers ---
 # Ensure you installed: pip install -U discord.py[voice] yt-dlp spotipy python-dotenv
-import yt_dlp
 from dotenv import load_dotenv
 import aiohttp
 
+from ytdl_worker import YTDL_CLIENTS, extract_once, extract_playlist
+
 # Spotify (optional). If not configured, we still work via YouTube.
 try:
     import spotipy
     from spotipy.oauth2 import SpotifyClientCredentials
+    from spotipy.cache_handler import MemoryCacheHandler
+    import requests
+    from requests.adapters import HTTPAdapter
     SPOTIFY_AVAILABLE = True
 except Exception:
     SPOTIFY_AVAILABLE = False
@@ -36,16 +48,16 @@ GUILD_ID: Optional[int] = int(GUILD_ID_ENV) if GUILD_ID_ENV and GUILD_ID_ENV.isd
 SPOTIFY_CLIENT_ID = os.getenv("SPOTIFY_CLIENT_ID")
 SPOTIFY_CLIENT_SECRET = os.getenv("SPOTIFY_CLIENT_SECRET")
 
-YTDL_OPTS = {
-    "format": "bestaudio[ext=m4a]/bestaudio/best",
-    "quiet": True,
-    "noplaylist": True,
-    "default_search": "ytsearch",
-    "source_address": "0.0.0.0",
-    # Use Android client to avoid SABR Missing URL; we also add fallbacks
-    "extractor_args": {"youtube": {"player_client": ["android"]}},
-    "ignore_no_formats_error": True,
-}
+# How many Spotify tracks are resolved on YouTube at the same time
+SPOTIFY_CONCURRENCY_ENV = os.getenv("SPOTIFY_CONCURRENCY")
+SPOTIFY_CONCURRENCY: int = int(SPOTIFY_CONCURRENCY_ENV) if SPOTIFY_CONCURRENCY_ENV and SPOTIFY_CONCURRENCY_ENV.isdigit() and int(SPOTIFY_CONCURRENCY_ENV) > 0 else 8
+
+# Threads for blocking work that isn't yt-dlp (spotipy calls, ffmpeg probes)
+BLOCKING_IO_WORKERS = 16
+
+# Worker processes dedicated to yt-dlp extraction
+YTDLP_WORKERS_ENV = os.getenv("YTDLP_WORKERS")
+YTDLP_WORKERS: int = int(YTDLP_WORKERS_ENV) if YTDLP_WORKERS_ENV and YTDLP_WORKERS_ENV.isdigit() and int(YTDLP_WORKERS_ENV) > 0 else min(4, os.cpu_count() or 2)
 
 FFMPEG_OPTS = {
     "before_options": "-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5",
@@ -53,7 +65,7 @@ FFMPEG_OPTS = {
 }
 
 # ------------- Data models -------------
-@dataclass
+@dataclass(slots=True)
 class Track:
     title: str
     url: str
@@ -61,33 +73,121 @@ class Track:
     requested_by_name: str
     requested_by_id: int
     duration: Optional[int] = None
-
-@dataclass
+    duration_str: str = ""  # formatted once, reused by /np and /queue
+    prefetched: bool = False  # stream URL refreshed shortly before playback
+    resolved: bool = True  # False for playlist placeholders whose stream URL is fetched just before playback
+    query: Optional[str] = None  # search text it was extracted from, so its cache entry can be dropped too
+
+    def __post_init__(self) -> None:
+        if self.duration and not self.duration_str:
+            self.duration_str = _fmt_duration(self.duration)
+
+class TrackQueue:
+    """Upcoming tracks (index 0 plays next) with an awaitable `get`, plus the in-place edits the commands need."""
+
+    def __init__(self) -> None:
+        self._dq: deque[Track] = deque()
+        self._ready = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self._dq)
+
+    def __iter__(self):
+        return iter(self._dq)
+
+    def put_nowait(self, track: Track) -> None:
+        self._dq.append(track)
+        self._ready.set()
+
+    def appendleft(self, track: Track) -> None:
+        self._dq.appendleft(track)
+        self._ready.set()
+
+    async def get(self) -> Track:
+        while not self._dq:
+            self._ready.clear()
+            await self._ready.wait()
+        return self._dq.popleft()
+
+    def peek(self) -> Optional[Track]:
+        return self._dq[0] if self._dq else None
+
+    def remove(self, start: int, stop: int) -> List[Track]:
+        """Remove and return items [start, stop) (0-based)."""
+        # Rotate the range to the front, pop it off, then rotate back
+        self._dq.rotate(-start)
+        removed = [self._dq.popleft() for _ in range(stop - start)]
+        self._dq.rotate(start)
+        return removed
+
+    def move(self, src: int, dest: int) -> Track:
+        """Move the item at `src` to `dest` (0-based) and return it."""
+        item = self._dq[src]
+        del self._dq[src]
+        self._dq.insert(dest, item)
+        return item
+
+    def shuffle(self) -> None:
+        # Indexing into the middle of a deque is O(n), so shuffle a list copy once
+        items = list(self._dq)
+        random.shuffle(items)
+        self._dq.clear()
+        self._dq.extend(items)
+
+    def clear(self) -> int:
+        n = len(self._dq)
+        self._dq.clear()
+        return n
+
+@dataclass(slots=True)
 class GuildPlayer:
     voice: Optional[discord.VoiceClient] = None
-    queue: asyncio.Queue = field(default_factory=asyncio.Queue)
+    queue: TrackQueue = field(default_factory=TrackQueue)
     now_playing: Optional[Track] = None
+    # Static parts of the /np message, built once per track; only the elapsed time goes in between
+    np_head: str = ""
+    np_tail: str = ""
     player_task: Optional[asyncio.Task] = None
-    volume: float = 0.5
+    prefetch_task: Optional[asyncio.Task] = None  # at most one next-track prefetch in flight
+    enqueue_tasks: set[asyncio.Task] = field(default_factory=set)  # playlists still being added in the background
+    volume: float = 0.5  # no command changes it yet, so _make_source always takes the filter path
     announce_channel_id: Optional[int] = None  # where to announce Now Playing
     loop_one: bool = False
     loop_all: bool = False
     play_started_at: Optional[float] = None
 
-    async def ensure_player(self, bot: commands.Bot, guild: discord.Guild) -> None:
+    def ensure_player(self, bot: commands.Bot, guild: discord.Guild) -> None:
+        # Plain (non-async) on purpose: check-and-spawn can't be interleaved with another command
         if self.player_task is None or self.player_task.done():
             self.player_task = asyncio.create_task(self._player_loop(bot, guild))
 
     async def _player_loop(self, bot: commands.Bot, guild: discord.Guild) -> None:
         while True:
-            track: Track = await self.queue.get()
-            self.now_playing = track
+            try:
+                track = await self.queue.get()
+            except asyncio.CancelledError:
+                return
+            self.set_now_playing(track)
             if not self.voice or not self.voice.is_connected():
-                self.now_playing = None
+                self.set_now_playing(None)
                 continue
 
+            # Playlist placeholders only get a stream URL right before they play
+            if not track.resolved:
+                # The prefetch may already be resolving it; wait for that instead of extracting twice
+                if self.prefetch_task and not self.prefetch_task.done():
+                    await asyncio.wait({self.prefetch_task})
+            if not track.resolved:
+                try:
+                    await self._resolve(track)
+                except Exception as e:
+                    print(f"Skipping unavailable track {track.webpage_url}: {e}")
+                    self.set_now_playing(None)
+                    continue
+                self.set_now_playing(track)  # title/duration may have changed
+
             # Update bot presence
-            await update_presence(track.title)
+            update_presence(track.title)
 
             next_event = asyncio.Event()
 
@@ -96,39 +196,165 @@ class GuildPlayer:
 
             try:
                 self.play_started_at = time.monotonic()
-                source = discord.FFmpegPCMAudio(track.url, executable=FFMPEG_PATH, **FFMPEG_OPTS)
-                audio = discord.PCMVolumeTransformer(source, volume=self.volume)
+                audio = await self._make_source(track.url)
                 self.voice.play(audio, after=after_playback)
             except Exception as e:
                 print(f"Playback error: {e} — mencoba re-ekstrak dengan klien lain…")
-                # Fallback: re-extract with different client profiles
+                # Fallback: re-extract with different client profiles (the cached stream URL may be the broken one)
                 try:
-                    title, stream, page, duration = await extract_from_youtube(track.webpage_url)
-                    track.title, track.url, track.webpage_url, track.duration = title, stream, page, duration
-                    source = discord.FFmpegPCMAudio(track.url, executable=FFMPEG_PATH, **FFMPEG_OPTS)
-                    audio = discord.PCMVolumeTransformer(source, volume=self.volume)
+                    _EXTRACT_CACHE.pop(cache_key(track.webpage_url))
+                    if track.query:
+                        _EXTRACT_CACHE.pop(cache_key(track.query))
+                    await self._resolve(track)
+                    self.set_now_playing(track)
+                    audio = await self._make_source(track.url)
                     self.voice.play(audio, after=after_playback)
                 except Exception as ee:
                     print(f"Fallback playback failed: {ee}")
                     next_event.set()
 
+            # Refresh the next track's stream URL while this one plays
+            next_track = self.queue.peek()
+            if not next_event.is_set() and next_track is not None and (self.prefetch_task is None or self.prefetch_task.done()):
+                if not next_track.prefetched:
+                    next_track.prefetched = True
+                    self.prefetch_task = spawn(self._prefetch(next_track))
+
             await next_event.wait()
-            self.now_playing = None
+            self.set_now_playing(None)
+            track.prefetched = False  # allow a fresh prefetch if looped back into the queue
             # If loop is enabled, re-queue accordingly
             if self.loop_one:
-                try:
-                    self.queue._queue.appendleft(track)  # type: ignore[attr-defined]
-                except Exception:
-                    await self.queue.put(track)
+                self.queue.appendleft(track)
             elif self.loop_all:
-                await self.queue.put(track)
-            if self.queue.empty():
-                await update_presence(None)
+                self.queue.put_nowait(track)
+            if not self.queue:
+                update_presence(None)
+
+    def add_enqueue_task(self, task: asyncio.Task) -> None:
+        self.enqueue_tasks.add(task)
+        task.add_done_callback(self.enqueue_tasks.discard)
+
+    def cancel_prefetch(self) -> None:
+        # Don't keep a yt-dlp worker busy on a track that won't play
+        if self.prefetch_task and not self.prefetch_task.done():
+            self.prefetch_task.cancel()
+        self.prefetch_task = None
+
+    def cancel_enqueue(self) -> None:
+        # Otherwise a playlist still loading refills the queue right after /stop or /clear
+        for task in self.enqueue_tasks:
+            task.cancel()
+        self.enqueue_tasks.clear()
+
+    def set_now_playing(self, track: Optional[Track]) -> None:
+        self.now_playing = track
+        if track is None:
+            self.np_head = self.np_tail = ""
+            return
+        self.np_head = f"🎵 Now Playing: **[{track.title}]({track.webpage_url})** ["
+        total = f"/{track.duration_str}" if track.duration_str else ""
+        self.np_tail = f"{total}] — requested by <@{track.requested_by_id}>"
+
+    async def _make_source(self, url: str) -> discord.FFmpegOpusAudio:
+        # ffmpeg encodes Opus itself, so Python never touches the audio frames
+        if abs(self.volume - 1.0) < 1e-3:
+            # Inactive until a volume control exists (volume is fixed at 0.5).
+            # No filter needed: probe so Opus streams can be passed through without re-encoding
+            return await discord.FFmpegOpusAudio.from_probe(
+                url, executable=FFMPEG_PATH, method="fallback",
+                before_options=FFMPEG_OPTS["before_options"], options=FFMPEG_OPTS["options"],
+            )
+        # A volume filter needs a re-encode, so skip the probe (stream copy can't be filtered)
+        options = f"{FFMPEG_OPTS['options']} -filter:a volume={self.volume}"
+        return discord.FFmpegOpusAudio(url, executable=FFMPEG_PATH, before_options=FFMPEG_OPTS["before_options"], options=options)
+
+    async def _resolve(self, track: Track) -> None:
+        title, stream, page, duration = await extract_from_youtube(track.webpage_url)
+        track.title, track.url, track.webpage_url, track.duration = title, stream, page, duration
+        track.duration_str = _fmt_duration(duration) if duration else ""
+        track.resolved = True
+
+    async def _prefetch(self, track: Track) -> None:
+        try:
+            await self._resolve(track)
+        except Exception as e:
+            print(f"Prefetch failed for {track.title}: {e}")
+
+# ------------- Caches -------------
+class TTLCache:
+    """Small LRU cache whose entries also expire after `ttl` seconds."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[str, Tuple[float, object]] = OrderedDict()
+
+    def get(self, key: str):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if time.monotonic() >= expires_at:
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def put(self, key: str, value) -> None:
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: str) -> None:
+        self._data.pop(key, None)
+
+# googlevideo stream URLs expire after ~6h, keep extractions a bit shorter than that
+_EXTRACT_CACHE = TTLCache(maxsize=1024, ttl=4 * 3600)
+# Spotify URL -> YouTube search queries; short TTL since playlists get edited
+_SPOTIFY_CACHE = TTLCache(maxsize=256, ttl=600)
+# Playlist contents change more often than videos do
+_PLAYLIST_CACHE = TTLCache(maxsize=128, ttl=600)
+
+# Query params that only track where a link was shared from; they don't change the video
+_TRACKER_PARAMS = {"si", "feature", "pp", "ab_channel", "utm_source", "utm_medium", "utm_campaign"}
+
+def cache_key(query: str) -> str:
+    q = query.strip()
+    if q.lower().startswith(("http://", "https://")):
+        parts = urlsplit(q)
+        params = [(k, v) for k, v in parse_qsl(parts.query) if k not in _TRACKER_PARAMS]
+        # Video/playlist/Spotify IDs are case-sensitive, so only scheme and host are normalized
+        return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, urlencode(params), ""))
+    return q.lower()
 
 # ------------- Helpers -------------
-YOUTUBE_URL_RE = re.compile(r"(https?://)?(www\.)?(youtube\.com|youtu\.be)/.+")
-YOUTUBE_PLAYLIST_RE = re.compile(r"(?:https?://)?(?:www\.)?(?:youtube\.com|youtu\.be)/.*(?:[?&])list=([A-Za-z0-9_-]+)")
-SPOTIFY_URL_RE = re.compile(r"https?://open\.spotify\.com/(track|playlist)/[A-Za-z0-9]+")
+# Only the Spotify link type is ever read back, so every other group is non-capturing
+YOUTUBE_PLAYLIST_RE = re.compile(r"(?:https?://)?(?:www\.)?(?:youtube\.com|youtu\.be)/.*[?&]list=[A-Za-z0-9_-]+", re.ASCII)
+SPOTIFY_URL_RE = re.compile(r"https?://open\.spotify\.com/(track|playlist)/[A-Za-z0-9]+", re.ASCII)
+_youtube_playlist_search = YOUTUBE_PLAYLIST_RE.search
+_spotify_url_match = SPOTIFY_URL_RE.match
+
+# Plain prefix checks are much cheaper than regex for classifying a query as a URL
+YOUTUBE_URL_PREFIXES = tuple(
+    f"{scheme}{www}{host}/"
+    for scheme in ("https://", "http://", "")
+    for www in ("www.", "")
+    for host in ("youtube.com", "youtu.be")
+) + ("https://m.youtube.com/", "https://music.youtube.com/")
+SPOTIFY_URL_PREFIXES = (
+    "https://open.spotify.com/track/",
+    "https://open.spotify.com/playlist/",
+    "http://open.spotify.com/track/",
+    "http://open.spotify.com/playlist/",
+)
+
+def is_youtube_url(q: str) -> bool:
+    return q.startswith(YOUTUBE_URL_PREFIXES)
+
+def is_spotify_url(q: str) -> bool:
+    return q.startswith(SPOTIFY_URL_PREFIXES)
 
 _spotify_client: Optional["spotipy.Spotify"] = None
 
@@ -138,54 +364,72 @@ def get_spotify_client() -> Optional["spotipy.Spotify"]:
         return None
     if SPOTIFY_CLIENT_ID and SPOTIFY_CLIENT_SECRET:
         if _spotify_client is None:
-            auth_mgr = SpotifyClientCredentials(client_id=SPOTIFY_CLIENT_ID, client_secret=SPOTIFY_CLIENT_SECRET)
-            _spotify_client = spotipy.Spotify(auth_manager=auth_mgr)
+            # Keep the 1h access token in memory so calls don't go back to the token endpoint
+            auth_mgr = SpotifyClientCredentials(
+                client_id=SPOTIFY_CLIENT_ID,
+                client_secret=SPOTIFY_CLIENT_SECRET,
+                cache_handler=MemoryCacheHandler(),
+            )
+            # Playlist pages are fetched in parallel; keep enough warm keep-alive connections for that
+            session = requests.Session()
+            session.mount("https://", HTTPAdapter(pool_connections=16, pool_maxsize=32))
+            session.headers["Accept-Encoding"] = "gzip"
+            _spotify_client = spotipy.Spotify(auth_manager=auth_mgr, requests_session=session)
         return _spotify_client
     return None
 
+def _fmt_duration(s: int) -> str:
+    h = s // 3600
+    m = (s // 60) % 60
+    sec = s % 60
+    return f"{h}:{m:02d}:{sec:02d}" if h else f"{m}:{sec:02d}"
+
+# yt-dlp's JS/signature work is CPU-bound and holds the GIL, so extractions run in worker
+# processes (each keeps its own pooled YoutubeDL instances, see ytdl_worker.py). Created lazily
+# so spawned workers, which still re-import this script as __mp_main__, don't build pools of their own.
+_ytdlp_pool: Optional[ProcessPoolExecutor] = None
+
+def get_ytdlp_pool() -> ProcessPoolExecutor:
+    global _ytdlp_pool
+    if _ytdlp_pool is None:
+        _ytdlp_pool = ProcessPoolExecutor(
+            max_workers=YTDLP_WORKERS,
+            # spawn: forking a process that already runs the event loop & executor threads is unsafe
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+        atexit.register(_ytdlp_pool.shutdown, wait=False)
+    return _ytdlp_pool
+
+async def run_in_ytdlp_pool(fn, *args):
+    global _ytdlp_pool
+    loop = asyncio.get_running_loop()
+    pool = get_ytdlp_pool()
+    try:
+        return await loop.run_in_executor(pool, fn, *args)
+    except BrokenProcessPool:
+        # A worker died (e.g. OOM kill) and the pool can't recover; replace it and retry once
+        if _ytdlp_pool is pool:
+            _ytdlp_pool = None
+            pool.shutdown(wait=False)
+        return await loop.run_in_executor(get_ytdlp_pool(), fn, *args)
+
 async def extract_from_youtube(query: str) -> Tuple[str, str, str, Optional[int]]:
     """Return (title, stream_url, webpage_url) from a YouTube URL or search query.
     Tries multiple player clients to avoid SABR/403 and manually selects audio-only format if needed.
     """
-    loop = asyncio.get_running_loop()
+    key = cache_key(query)
+    cached = _EXTRACT_CACHE.get(key)
+    if cached is not None:
+        return cached
 
-    async def _try_with_clients(clients: List[str]):
-        def _extract_once(client: str):
-            local_opts = YTDL_OPTS.copy()
-            local_opts["extractor_args"] = {"youtube": {"player_client": [client]}}
-            with yt_dlp.YoutubeDL(local_opts) as ydl:
-                if YOUTUBE_URL_RE.match(query):
-                    info = ydl.extract_info(query, download=False)
-                else:
-                    info = ydl.extract_info(f"ytsearch:{query}", download=False)
-                    if "entries" in info and info["entries"]:
-                        info = info["entries"][0]
-                stream_url = info.get("url")
-                if not stream_url:
-                    fmts = info.get("formats") or []
-                    audio_fmts = [
-                        f for f in fmts
-                        if (f.get("vcodec") in ("none", None)) and (f.get("acodec") not in ("none", None)) and f.get("url")
-                    ]
-                    def _key(f):
-                        ext = f.get("ext") or ""
-                        abr = f.get("abr") or 0
-                        return (ext != "m4a", -abr)
-                    audio_fmts.sort(key=_key)
-                    if audio_fmts:
-                        stream_url = audio_fmts[0]["url"]
-                duration = info.get("duration")
-                if duration is not None:
-                    try:
-                        duration = int(duration)
-                    except Exception:
-                        duration = None
-                return info.get("title", "Unknown"), stream_url, info.get("webpage_url", info.get("original_url", query)), duration
+    # Classify once; the answer is the same for every client retry
+    target = query if is_youtube_url(query) else f"ytsearch:{query}"
 
+    async def _try_with_clients(clients: Tuple[str, ...]):
         last_err = None
         for c in clients:
             try:
-                return await loop.run_in_executor(None, _extract_once, c)
+                return await run_in_ytdlp_pool(extract_once, c, target, query)
             except Exception as e:
                 last_err = e
                 continue
@@ -193,75 +437,140 @@ async def extract_from_youtube(query: str) -> Tuple[str, str, str, Optional[int]
             raise last_err
         raise RuntimeError("Ekstraksi gagal.")
 
-    title, stream_url, webpage_url, duration = await _try_with_clients(["android", "web", "tv"])
+    title, stream_url, webpage_url, duration = await _try_with_clients(YTDL_CLIENTS)
     if not stream_url:
         raise RuntimeError("Tidak dapat mengekstrak audio dari YouTube.")
-    return title, stream_url, webpage_url, duration
+    result = (title, stream_url, webpage_url, duration)
+    _EXTRACT_CACHE.put(key, result)
+    # Also under the video URL, so the pre-play refresh of a searched track is a cache hit
+    page_key = cache_key(webpage_url)
+    if page_key != key:
+        _EXTRACT_CACHE.put(page_key, result)
+    return result
+
+async def spotify_call(fn, *args, **kwargs):
+    """Run a blocking spotipy call in the executor so the event loop (and voice) keeps running."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, functools.partial(fn, *args, **kwargs))
 
-async def resolve_spotify_to_query(url: str) -> List[str]:
+def _spotify_page_queries(page: dict) -> List[str]:
+    return [
+        f"{t.get('name')} {', '.join(a.get('name') for a in t.get('artists', []))} audio"
+        for it in page.get("items") or []
+        if (t := it.get("track"))
+    ]
+
+SPOTIFY_PAGE_SIZE = 100
+# Only ask for what we build queries from; full track objects are much larger
+SPOTIFY_ITEM_FIELDS = "items(track(name,artists(name)))"
+
+async def resolve_spotify_to_query(url: str, limit: int = 50) -> List[str]:
+    """Return up to `limit` YouTube search queries for a Spotify track/playlist URL."""
     sp = get_spotify_client()
     if sp is None:
         # Fallback: just return as-is so it will search on YouTube
         return [url]
 
+    key = f"{cache_key(url)}|{limit}"
+    cached = _SPOTIFY_CACHE.get(key)
+    if cached is not None:
+        return list(cached)
+
+    m = _spotify_url_match(url)
+    kind = m.group(1) if m else None
     items: List[str] = []
-    if "/track/" in url:
-        track = sp.track(url)
+    if kind == "track":
+        track = await spotify_call(sp.track, url)
         name = track["name"]
         artists = ", ".join(a["name"] for a in track["artists"])
         items.append(f"{name} {artists} audio")
-    elif "/playlist/" in url:
-        results = sp.playlist_items(url, additional_types=("track",))
-        while results:
-            for it in results["items"]:
-                t = it.get("track")
-                if not t:
-                    continue
-                name = t.get("name")
-                artists = ", ".join(a.get("name") for a in t.get("artists", []))
-                items.append(f"{name} {artists} audio")
-            results = sp.next(results) if results.get("next") else None
+    elif kind == "playlist":
+        first = await spotify_call(
+            sp.playlist_items, url, fields=f"{SPOTIFY_ITEM_FIELDS},total", limit=min(limit, SPOTIFY_PAGE_SIZE), additional_types=("track",)
+        )
+        items.extend(_spotify_page_queries(first))
+        # Total is known after the first page; fetch only the pages still needed to reach the limit, concurrently
+        total = min(first.get("total") or 0, limit)
+        pages = await asyncio.gather(*(
+            spotify_call(sp.playlist_items, url, fields=SPOTIFY_ITEM_FIELDS, limit=SPOTIFY_PAGE_SIZE, offset=offset, additional_types=("track",))
+            for offset in range(SPOTIFY_PAGE_SIZE, total, SPOTIFY_PAGE_SIZE)
+        ))
+        for page in pages:
+            items.extend(_spotify_page_queries(page))
+        del items[limit:]
     else:
         items.append(url)
-    return items
-
-async def expand_youtube_playlist(url: str, limit: int = 50) -> List[str]:
-    """Return a list of video watch URLs from a YouTube playlist (flat, no download)."""
-    loop = asyncio.get_running_loop()
+    _SPOTIFY_CACHE.put(key, items)
+    return list(items)
 
-    def _extract():
-        opts = YTDL_OPTS.copy()
-        opts["extract_flat"] = True
-        opts["noplaylist"] = False
-        opts["playlistend"] = limit
-        with yt_dlp.YoutubeDL(opts) as ydl:
-            info = ydl.extract_info(url, download=False)
-            entries = info.get("entries") or []
-            urls: List[str] = []
-            for e in entries:
-                u = e.get("url") or e.get("id")
-                if not u:
-                    continue
-                if not u.startswith("http"):
-                    u = f"https://www.youtube.com/watch?v={u}"
-                urls.append(u)
-            return urls
+async def expand_youtube_playlist(url: str, limit: int = 50) -> List[dict]:
+    """Return `{title, webpage_url, duration}` for each playlist entry (flat, no per-video extraction)."""
+    key = f"{cache_key(url)}|{limit}"
+    cached = _PLAYLIST_CACHE.get(key)
+    if cached is not None:
+        return list(cached)
 
     try:
-        return await loop.run_in_executor(None, _extract)
+        entries = await run_in_ytdlp_pool(extract_playlist, url, limit)
     except Exception:
         return []
+    if entries:
+        _PLAYLIST_CACHE.put(key, entries)
+    return list(entries)
 
 async def make_track(query_or_url: str, requested_by_id: int, requested_by_name: str) -> Track:
     # Accept YouTube URL, plain query, or Spotify URL (resolve to YouTube search)
-    if SPOTIFY_URL_RE.match(query_or_url):
-        queries = await resolve_spotify_to_query(query_or_url)
+    if is_spotify_url(query_or_url):
+        queries = await resolve_spotify_to_query(query_or_url, limit=1)
         first = queries[0]
         title, stream, page, duration = await extract_from_youtube(first)
-        return Track(title=title, url=stream, webpage_url=page, requested_by_name=requested_by_name, requested_by_id=requested_by_id, duration=duration)
+        return Track(title=title, url=stream, webpage_url=page, requested_by_name=requested_by_name, requested_by_id=requested_by_id, duration=duration, query=first)
     else:
         title, stream, page, duration = await extract_from_youtube(query_or_url)
-        return Track(title=title, url=stream, webpage_url=page, requested_by_name=requested_by_name, requested_by_id=requested_by_id, duration=duration)
+        return Track(title=title, url=stream, webpage_url=page, requested_by_name=requested_by_name, requested_by_id=requested_by_id, duration=duration, query=query_or_url)
+
+# Keep references to fire-and-forget tasks so they aren't garbage-collected mid-run
+_background_tasks: set[asyncio.Task] = set()
+
+def spawn(coro) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+async def first_playable_track(queries: List[str], requested_by_id: int, requested_by_name: str) -> Tuple[int, Optional[Track]]:
+    """Resolve queries one by one until one works; return (index, track) or (-1, None)."""
+    for idx, q in enumerate(queries):
+        try:
+            return idx, await make_track(q, requested_by_id=requested_by_id, requested_by_name=requested_by_name)
+        except Exception:
+            continue  # skip unavailable video
+    return -1, None
+
+async def enqueue_in_order(gp: "GuildPlayer", queries: List[str], requested_by_id: int, requested_by_name: str) -> int:
+    """Resolve queries concurrently and enqueue them in their original order as soon as each is ready."""
+    sem = asyncio.Semaphore(SPOTIFY_CONCURRENCY)
+
+    async def _one(q: str) -> Track:
+        async with sem:
+            return await make_track(q, requested_by_id=requested_by_id, requested_by_name=requested_by_name)
+
+    tasks = [asyncio.create_task(_one(q)) for q in queries]
+    added = 0
+    try:
+        for task in tasks:
+            try:
+                t = await task
+            except Exception:
+                continue  # skip unavailable ones
+            if not gp.voice or not gp.voice.is_connected():
+                break  # bot left voice meanwhile, stop adding
+            gp.queue.put_nowait(t)
+            added += 1
+    finally:
+        for task in tasks:
+            task.cancel()
+    return added
 
 # ------------- Bot setup -------------
 intents = discord.Intents.default()
@@ -271,22 +580,62 @@ bot = commands.Bot(command_prefix=commands.when_mentioned_or("!"), intents=inten
 
 guild_players: dict[int, GuildPlayer] = {}
 
-# Presence helper — show current track in bot status
-async def update_presence(title: Optional[str]) -> None:
+# Presence helper — show current track in bot status.
+# Discord only allows ~5 presence updates per minute, so updates are coalesced:
+# callers never wait, and a single writer applies the latest title at most every few seconds.
+PRESENCE_MIN_INTERVAL = 12.0
+
+_presence_queue: Optional[asyncio.Queue] = None
+_presence_task: Optional[asyncio.Task] = None
+
+def update_presence(title: Optional[str]) -> None:
+    global _presence_queue, _presence_task
+    if _presence_queue is None:
+        _presence_queue = asyncio.Queue(maxsize=1)
+    # Drop any pending update; only the newest one matters
     try:
-        if title:
-            await bot.change_presence(activity=discord.Activity(type=discord.ActivityType.listening, name=title))
-        else:
-            await bot.change_presence(activity=discord.Game(name="/play to play music"))
-    except Exception:
+        _presence_queue.get_nowait()
+    except asyncio.QueueEmpty:
         pass
+    _presence_queue.put_nowait(title)
+    if _presence_task is None or _presence_task.done():
+        _presence_task = asyncio.create_task(_presence_writer(_presence_queue))
+
+_UNSET = object()
+
+async def _presence_writer(q: asyncio.Queue) -> None:
+    last_sent = 0.0
+    last_title = _UNSET
+    while True:
+        title = await q.get()
+        if title == last_title:
+            continue  # e.g. loop_one replaying the same track
+        wait = last_sent + PRESENCE_MIN_INTERVAL - time.monotonic()
+        if wait > 0:
+            await asyncio.sleep(wait)
+            # Newer updates may have arrived while waiting
+            try:
+                title = q.get_nowait()
+            except asyncio.QueueEmpty:
+                pass
+            if title == last_title:
+                continue
+        try:
+            if title:
+                await bot.change_presence(activity=discord.Activity(type=discord.ActivityType.listening, name=title))
+            else:
+                await bot.change_presence(activity=discord.Game(name="/play to play music"))
+        except Exception:
+            pass
+        last_sent = time.monotonic()
+        last_title = title
 
 def get_player(guild_id: int) -> GuildPlayer:
     gp = guild_players.get(guild_id)
-    if gp is None:
-        gp = GuildPlayer()
-        guild_players[guild_id] = gp
-    return gp
+    if gp is not None:
+        return gp
+    # Miss path only: setdefault keeps a single instance per guild
+    return guild_players.setdefault(guild_id, GuildPlayer())
 
 # ------------- Voice helpers -------------
 async def ensure_voice(interaction: discord.Interaction) -> GuildPlayer:
@@ -315,7 +664,7 @@ async def on_ready():
         print(f"Synced {len(synced_global)} global commands")
 
         # Fast per-guild sync for every guild the bot is currently in (instant availability)
-        for g in bot.guilds:
+        async def _sync_one(g: discord.Guild) -> None:
             try:
                 guild_obj = discord.Object(id=g.id)
                 bot.tree.copy_global_to(guild=guild_obj)
@@ -323,11 +672,14 @@ async def on_ready():
                 print(f"Synced {len(sg)} commands to guild {g.id}")
             except Exception as ge:
                 print(f"Guild sync failed for {g.id}: {ge}")
+
+        # Each sync is an independent HTTP round-trip, so run them concurrently
+        await asyncio.gather(*(_sync_one(g) for g in bot.guilds), return_exceptions=True)
     except Exception as e:
         print(f"Slash sync failed: {e}")
     print(f"Logged in as {bot.user} (ID: {bot.user.id})")
     # Set idle presence on startup
-    await update_presence(None)
+    update_presence(None)
 
 @bot.tree.command(name="ping", description="Measure latency (gateway & internet)")
 @app_commands.describe(target="What to test: all/gateway/internet")
@@ -384,7 +736,7 @@ async def ping(interaction: discord.Interaction, target: Optional[app_commands.C
         else:
             parts.append("**Internet** (HTTP): unreachable ❌")
 
-    await interaction.followup.send("".join(parts))
+    await interaction.followup.send("\n".join(parts))
 
 @bot.tree.command(name="join", description="Have the bot join your voice channel")
 async def join(interaction: discord.Interaction):
@@ -405,40 +757,23 @@ async def play(interaction: discord.Interaction, query: str):
         gp.announce_channel_id = interaction.channel.id if interaction.channel else None
 
         # Auto-detect YouTube playlist and expand into queue
-        if YOUTUBE_PLAYLIST_RE.search(query):
-            video_urls = await expand_youtube_playlist(query, limit=50)
-            if video_urls:
-                # Find first playable track
-                first_track: Optional[Track] = None
-                first_idx: int = -1
-                for idx, vu in enumerate(video_urls):
-                    try:
-                        cand = await make_track(vu, requested_by_id=interaction.user.id, requested_by_name=interaction.user.display_name)
-                        await gp.queue.put(cand)
-                        first_track = cand
-                        first_idx = idx
-                        break
-                    except Exception:
-                        continue  # skip unavailable video
-
-                if first_track is None:
-                    await interaction.followup.send("❌ Couldn't queue any playable tracks from that playlist.")
-                    return
-
-                # Enqueue the rest, skipping any unavailable ones
-                enqueued_rest = 0
-                for j, vu in enumerate(video_urls):
-                    if j == first_idx:
-                        continue
-                    try:
-                        t = await make_track(vu, requested_by_id=interaction.user.id, requested_by_name=interaction.user.display_name)
-                        await gp.queue.put(t)
-                        enqueued_rest += 1
-                    except Exception:
-                        continue
-
-                await gp.ensure_player(bot, interaction.guild)
-                more = f"… ({enqueued_rest}) more" if enqueued_rest else ""
+        if "list=" in query and _youtube_playlist_search(query):
+            entries = await expand_youtube_playlist(query, limit=50)
+            if entries:
+                # Queue lightweight placeholders; the player resolves each stream URL just before playing it
+                tracks = [
+                    Track(
+                        title=e["title"], url="", webpage_url=e["webpage_url"],
+                        requested_by_name=interaction.user.display_name, requested_by_id=interaction.user.id,
+                        duration=e["duration"], resolved=False,
+                    )
+                    for e in entries
+                ]
+                for t in tracks:
+                    gp.queue.put_nowait(t)
+                gp.ensure_player(bot, interaction.guild)
+                first_track = tracks[0]
+                more = f"\n… ({len(tracks) - 1}) more" if len(tracks) > 1 else ""
                 msg = (
                     "✅ Playlist detected. Now queued to start with: "
                     f"\n**[{first_track.title}]({first_track.webpage_url})** — requested by <@{interaction.user.id}>"
@@ -453,8 +788,8 @@ async def play(interaction: discord.Interaction, query: str):
 
         # Normal single track / URL / query flow
         track = await make_track(query, requested_by_id=interaction.user.id, requested_by_name=interaction.user.display_name)
-        await gp.queue.put(track)
-        await gp.ensure_player(bot, interaction.guild)
+        gp.queue.put_nowait(track)
+        gp.ensure_player(bot, interaction.guild)
         await interaction.followup.send(
             f"✅ Added: **[{track.title}]({track.webpage_url})** — requested by <@{track.requested_by_id}>"
         )
@@ -472,25 +807,22 @@ async def spotify_cmd(interaction: discord.Interaction, query: str):
         gp.announce_channel_id = interaction.channel.id if interaction.channel else None
 
         # URL Spotify (track/playlist)
-        if SPOTIFY_URL_RE.match(query):
-            queries = await resolve_spotify_to_query(query)
-            titles_links: List[Tuple[str, str]] = []
-            for q in queries[:50]:  # limit to avoid spam
-                try:
-                    t = await make_track(q, requested_by_id=interaction.user.id, requested_by_name=interaction.user.display_name)
-                    await gp.queue.put(t)
-                    titles_links.append((t.title, t.webpage_url))
-                except Exception:
-                    continue
-            await gp.ensure_player(bot, interaction.guild)
-            added = len(titles_links)
-            if added:
-                preview = "".join(f"- [{title}]({url})" for title, url in titles_links[:5])
-                more = "" if added <= 5 else f"…and {added-5} more"
-                msg = f"✅ Added {added} tracks from Spotify:{preview}{more}"
-            else:
-                msg = "❌ Nothing could be added."
-            await interaction.followup.send(msg)
+        if is_spotify_url(query):
+            queries = await resolve_spotify_to_query(query, limit=50)  # limit to avoid spam
+            # Start playing the first playable track, resolve the rest in the background
+            first_idx, first_track = await first_playable_track(queries, interaction.user.id, interaction.user.display_name)
+            if first_track is None:
+                await interaction.followup.send("❌ Nothing could be added.")
+                return
+            gp.queue.put_nowait(first_track)
+            gp.ensure_player(bot, interaction.guild)
+            rest = queries[first_idx + 1:]
+            if rest:
+                gp.add_enqueue_task(spawn(enqueue_in_order(gp, rest, interaction.user.id, interaction.user.display_name)))
+            more = f"\n… adding ({len(rest)}) more in the background" if rest else ""
+            await interaction.followup.send(
+                f"✅ Added from Spotify: **[{first_track.title}]({first_track.webpage_url})** — requested by <@{interaction.user.id}>{more}"
+            )
             return
 
         # Pencarian judul di Spotify → resolve ke YouTube
@@ -498,7 +830,7 @@ async def spotify_cmd(interaction: discord.Interaction, query: str):
         if sp is None:
             await interaction.followup.send("❌ Spotify is not configured. Set SPOTIFY_CLIENT_ID/SECRET in .env.")
             return
-        res = sp.search(q=query, type="track", limit=1)
+        res = await spotify_call(sp.search, q=query, type="track", limit=1)
         items = res.get("tracks", {}).get("items", [])
         if not items:
             await interaction.followup.send("❌ No results found on Spotify.")
@@ -508,8 +840,8 @@ async def spotify_cmd(interaction: discord.Interaction, query: str):
         artists = ", ".join(a.get("name") for a in tt.get("artists", []))
         yquery = f"{name} {artists} audio"
         t = await make_track(yquery, requested_by_id=interaction.user.id, requested_by_name=interaction.user.display_name)
-        await gp.queue.put(t)
-        await gp.ensure_player(bot, interaction.guild)
+        gp.queue.put_nowait(t)
+        gp.ensure_player(bot, interaction.guild)
         await interaction.followup.send(f"✅ Added dari Spotify: **[{name} — {artists}]({t.webpage_url})** — requested by <@{interaction.user.id}>")
     except Exception as e:
         await interaction.followup.send(f"❌ Failed to process Spotify: {e}")
@@ -548,29 +880,20 @@ async def resume(interaction: discord.Interaction):
 async def stop(interaction: discord.Interaction):
     assert interaction.guild is not None
     gp = get_player(interaction.guild.id)
-    while not gp.queue.empty():
-        try:
-            gp.queue.get_nowait()
-            gp.queue.task_done()
-        except Exception:
-            break
+    gp.cancel_enqueue()
+    gp.cancel_prefetch()
+    gp.queue.clear()
     if gp.voice and (gp.voice.is_playing() or gp.voice.is_paused()):
         gp.voice.stop()
-    await update_presence(None)
+    update_presence(None)
     await interaction.response.send_message("⏹️ Stopped and cleared the queue.")
 
 @bot.tree.command(name="clear", description="Clear all queued tracks without stopping the current song")
 async def clear_cmd(interaction: discord.Interaction):
     assert interaction.guild is not None
     gp = get_player(interaction.guild.id)
-    cleared = 0
-    while not gp.queue.empty():
-        try:
-            gp.queue.get_nowait()
-            gp.queue.task_done()
-            cleared += 1
-        except Exception:
-            break
+    gp.cancel_enqueue()
+    cleared = gp.queue.clear()
     await interaction.response.send_message(f"🧹 Queue cleared. Removed {cleared} tracks.")
 
 @bot.tree.command(name="loop", description="Set or show loop mode (off/track/queue)")
@@ -610,13 +933,7 @@ async def remove_cmd(interaction: discord.Interaction, index: int, end: Optional
     assert interaction.guild is not None
     gp = get_player(interaction.guild.id)
 
-    dq = getattr(gp.queue, "_queue", None)
-    if dq is None:
-        await interaction.response.send_message("Queue is empty.", ephemeral=True)
-        return
-
-    items: List[Track] = list(dq)
-    qlen = len(items)
+    qlen = len(gp.queue)
     if qlen == 0:
         await interaction.response.send_message("Queue is empty.", ephemeral=True)
         return
@@ -643,13 +960,7 @@ async def remove_cmd(interaction: discord.Interaction, index: int, end: Optional
         await interaction.response.send_message(f"Index out of range. Queue has {qlen} items.", ephemeral=True)
         return
 
-    removed = items[start-1:stop]  # inclusive range
-    kept = items[:start-1] + items[stop:]
-
-    # Apply back to the underlying deque
-    dq.clear()
-    for it in kept:
-        dq.append(it)
+    removed = gp.queue.remove(start - 1, stop)  # inclusive range
 
     if len(removed) == 1:
         r = removed[0]
@@ -657,10 +968,10 @@ async def remove_cmd(interaction: discord.Interaction, index: int, end: Optional
             f"🗑️ Removed **{r.title}** from the queue."
         )
     else:
-        preview = "".join(f"- **[{t.title}]({t.webpage_url})**" for t in removed[:5])
-        more = "" if len(removed) <= 5 else f"…and {len(removed)-5} more"
+        preview = "\n".join([f"- **[{t.title}]({t.webpage_url})**" for t in removed[:5]])
+        more = "" if len(removed) <= 5 else f"\n…and {len(removed)-5} more"
         await interaction.response.send_message(
-            f"🗑️ Removed {len(removed)} tracks from the queue:{preview}{more}"
+            f"🗑️ Removed {len(removed)} tracks from the queue:\n{preview}{more}"
         )
 
 @bot.tree.command(name="move", description="Move a track to a new position in the queue")
@@ -669,13 +980,7 @@ async def move_cmd(interaction: discord.Interaction, src: int, dest: int):
     assert interaction.guild is not None
     gp = get_player(interaction.guild.id)
 
-    dq = getattr(gp.queue, "_queue", None)
-    if dq is None:
-        await interaction.response.send_message("Queue is empty.", ephemeral=True)
-        return
-
-    items: List[Track] = list(dq)
-    qlen = len(items)
+    qlen = len(gp.queue)
     if qlen == 0:
         await interaction.response.send_message("Queue is empty.", ephemeral=True)
         return
@@ -695,12 +1000,7 @@ async def move_cmd(interaction: discord.Interaction, src: int, dest: int):
         await interaction.response.send_message("Source and destination are the same.", ephemeral=True)
         return
 
-    item = items.pop(src - 1)
-    items.insert(dest - 1, item)
-
-    dq.clear()
-    for it in items:
-        dq.append(it)
+    item = gp.queue.move(src - 1, dest - 1)
 
     await interaction.response.send_message(f"↔️ Moved **{item.title}** from {src} to {dest}.")
 
@@ -709,130 +1009,106 @@ async def shuffle_cmd(interaction: discord.Interaction):
     assert interaction.guild is not None
     gp = get_player(interaction.guild.id)
 
-    dq = getattr(gp.queue, "_queue", None)
-    if dq is None:
-        await interaction.response.send_message("Queue is empty.", ephemeral=True)
-        return
-
-    items: List[Track] = list(dq)
-    if len(items) < 2:
+    if len(gp.queue) < 2:
         await interaction.response.send_message("Not enough items to shuffle.", ephemeral=True)
         return
 
-    random.shuffle(items)
+    gp.queue.shuffle()
 
-    dq.clear()
-    for it in items:
-        dq.append(it)
+    await interaction.response.send_message(f"🔀 Shuffled {len(gp.queue)} queued tracks.")
 
-    await interaction.response.send_message(f"🔀 Shuffled {len(items)} queued tracks.")
+# (np_head, np_tail, duration, play_started_at): everything needed to redraw the now-playing line later
+NowPlayingSnapshot = Tuple[str, str, Optional[int], Optional[float]]
+
+def np_snapshot(gp: GuildPlayer) -> Optional[NowPlayingSnapshot]:
+    t = gp.now_playing
+    if not t:
+        return None
+    return gp.np_head, gp.np_tail, t.duration, gp.play_started_at
+
+def now_playing_text(np: NowPlayingSnapshot) -> str:
+    """Fill the elapsed time into the cached now-playing head/tail."""
+    head, tail, duration, play_started_at = np
+    elapsed = 0
+    if play_started_at is not None:
+        elapsed = max(0, int(time.monotonic() - play_started_at))
+    if duration:
+        elapsed = min(elapsed, duration)
+    return f"{head}{_fmt_duration(elapsed)}{tail}"
+
+def build_now_playing(gp: GuildPlayer) -> Tuple[str, bool]:
+    """Return (message, ephemeral) for /np and /nowplaying."""
+    np = np_snapshot(gp)
+    if np is None:
+        return "Nothing is playing right now.", True
+    return now_playing_text(np), False
 
 @bot.tree.command(name="np", description="Show the currently playing track")
 async def np_cmd(interaction: discord.Interaction):
     assert interaction.guild is not None
-    gp = get_player(interaction.guild.id)
-    if gp.now_playing:
-        t = gp.now_playing
-        elapsed = 0
-        if gp.play_started_at is not None:
-            try:
-                elapsed = max(0, int(time.monotonic() - gp.play_started_at))
-            except Exception:
-                elapsed = 0
-        def fmt(s: int) -> str:
-            h, rem = divmod(s, 3600)
-            m, s = divmod(rem, 60)
-            return f"{h}:{m:02d}:{s:02d}" if h else f"{m}:{s:02d}"
-        ts = f" [{fmt(min(elapsed, t.duration))}/{fmt(t.duration)}]" if t.duration else f" [{fmt(elapsed)}]"
-        await interaction.response.send_message(
-            f"🎵 Now Playing: **[{t.title}]({t.webpage_url})**{ts} — requested by <@{t.requested_by_id}>"
-        )
-    else:
-        await interaction.response.send_message("Nothing is playing right now.", ephemeral=True)
+    msg, ephemeral = build_now_playing(get_player(interaction.guild.id))
+    await interaction.response.send_message(msg, ephemeral=ephemeral)
 
 @bot.tree.command(name="nowplaying", description="Show the currently playing track")
 async def nowplaying_cmd(interaction: discord.Interaction):
     assert interaction.guild is not None
-    gp = get_player(interaction.guild.id)
-    if gp.now_playing:
-        t = gp.now_playing
-        elapsed = 0
-        if gp.play_started_at is not None:
-            try:
-                elapsed = max(0, int(time.monotonic() - gp.play_started_at))
-            except Exception:
-                elapsed = 0
-        def fmt(s: int) -> str:
-            h, rem = divmod(s, 3600)
-            m, s = divmod(rem, 60)
-            return f"{h}:{m:02d}:{s:02d}" if h else f"{m}:{s:02d}"
-        ts = f" [{fmt(min(elapsed, t.duration))}/{fmt(t.duration)}]" if t.duration else f" [{fmt(elapsed)}]"
-        await interaction.response.send_message(
-            f"🎵 Now Playing: **[{t.title}]({t.webpage_url})**{ts} — requested by <@{t.requested_by_id}>"
-        )
-    else:
-        await interaction.response.send_message("Nothing is playing right now.", ephemeral=True)
+    msg, ephemeral = build_now_playing(get_player(interaction.guild.id))
+    await interaction.response.send_message(msg, ephemeral=ephemeral)
 
 # --- Queue pagination helpers ---
+def up_next_pages(pending: List[Track], per_page: int) -> List[str]:
+    """Render every "Up next" page body for `pending` (empty list if nothing is queued)."""
+    lines = [f"{idx}. **{it.title}** — requested by <@{it.requested_by_id}>" for idx, it in enumerate(pending, start=1)]
+    total_pages = (len(pending) + per_page - 1) // per_page
+    pages: List[str] = []
+    for page in range(total_pages):
+        start = page * per_page
+        end = start + per_page
+        header = f"**Up next** (page {page + 1}/{total_pages}):" if total_pages > 1 else "**Up next:**"
+        body = [header, *lines[start:end]]
+        if end < len(pending):
+            body.append(f"…{len(pending) - end} more queued")
+        pages.append("\n".join(body))
+    return pages
+
+def render_queue(np: Optional[NowPlayingSnapshot], page_body: Optional[str]) -> str:
+    body = page_body or "Up next: (empty)"
+    if np is None:
+        return body
+    return f"{now_playing_text(np)}\n{body}"
+
 class QueuePaginator(discord.ui.View):
-    def __init__(self, requester_id: int, now_playing: Optional[Track], play_started_at: Optional[float], pending: List[Track], per_page: int = 10, timeout: Optional[float] = 120):
+    def __init__(self, requester_id: int, np: Optional[NowPlayingSnapshot], pending: List[Track], per_page: int = 10, timeout: Optional[float] = 120):
         super().__init__(timeout=timeout)
+        # Resolve the two buttons once so page flips don't rescan the children
+        self._prev_btn: Optional[discord.ui.Button] = None
+        self._next_btn: Optional[discord.ui.Button] = None
+        for child in self.children:
+            if isinstance(child, discord.ui.Button):
+                if child.custom_id == "prev":
+                    self._prev_btn = child
+                elif child.custom_id == "next":
+                    self._next_btn = child
         self.requester_id = requester_id
-        self.now_playing = now_playing
-        self.play_started_at = play_started_at
+        self.np = np
         self.pending = pending
         self.per_page = per_page
         self.page = 0
         self.total_pages = (len(self.pending) + self.per_page - 1) // self.per_page if self.pending else 1
+        # The snapshot never changes, so render every page body once; page flips only pick one
+        self._page_bodies = up_next_pages(self.pending, self.per_page)
         self._update_buttons()
 
-    def _fmt(self, s: int) -> str:
-        h, rem = divmod(s, 3600)
-        m, s = divmod(rem, 60)
-        return f"{h}:{m:02d}:{s:02d}" if h else f"{m}:{s:02d}"
-
     def _render(self) -> str:
-        sections: List[str] = []
-        # Now playing
-        if self.now_playing:
-            t = self.now_playing
-            elapsed = 0
-            if self.play_started_at is not None:
-                try:
-                    elapsed = max(0, int(time.monotonic() - self.play_started_at))
-                except Exception:
-                    elapsed = 0
-            if t.duration:
-                elapsed = min(elapsed, t.duration)
-                ts = f"[{self._fmt(elapsed)}/{self._fmt(t.duration)}]"
-            else:
-                ts = f"[{self._fmt(elapsed)}]"
-            sections.append(f"🎵 Now Playing: **{t.title}** {ts} — requested by <@{t.requested_by_id}>\n")
-
-        if not self.pending:
-            sections.append("Up next: (empty)")
-            return "".join(sections)
-
-        start = self.page * self.per_page
-        end = start + self.per_page
-        slice_ = self.pending[start:end]
-
-        up_next_lines = [f"**Up next** (page {self.page + 1}/{self.total_pages}):"]
-        for idx, it in enumerate(slice_, start=start + 1):
-            up_next_lines.append(f"\n{idx}. **{it.title}** — requested by <@{it.requested_by_id}>")
-        if end < len(self.pending):
-            up_next_lines.append(f"\n…{len(self.pending) - end} more queued")
-        sections.append("".join(up_next_lines))
-        return "".join(sections)
+        body = self._page_bodies[self.page] if self._page_bodies else None
+        return render_queue(self.np, body)
 
     def _update_buttons(self):
         # Ensure buttons are in correct enabled/disabled state
-        for child in self.children:
-            if isinstance(child, discord.ui.Button):
-                if child.custom_id == "prev":
-                    child.disabled = (self.page <= 0)
-                elif child.custom_id == "next":
-                    child.disabled = (self.page >= self.total_pages - 1)
+        if self._prev_btn is not None:
+            self._prev_btn.disabled = (self.page <= 0)
+        if self._next_btn is not None:
+            self._next_btn.disabled = (self.page >= self.total_pages - 1)
 
     async def _maybe_block(self, interaction: discord.Interaction) -> bool:
         # Only allow the original requester to control pagination
@@ -867,49 +1143,20 @@ async def queue_cmd(interaction: discord.Interaction):
     assert interaction.guild is not None
     gp = get_player(interaction.guild.id)
 
-    # Snapshot pending items from the internal deque without consuming the queue
-    try:
-        dq = list(getattr(gp.queue, "_queue", []))
-        pending: List[Track] = list(dq)
-    except Exception:
-        pending = []
-
-    if not pending and not gp.now_playing:
+    qlen = len(gp.queue)
+    if not qlen and not gp.now_playing:
         await interaction.response.send_message("Queue is empty.", ephemeral=True)
         return
 
     # If few items, just print without paginator
-    if len(pending) <= 10:
-        sections: List[str] = []
-        # Now Playing (with timestamp)
-        if gp.now_playing:
-            t = gp.now_playing
-            elapsed = 0
-            if gp.play_started_at is not None:
-                try:
-                    elapsed = max(0, int(time.monotonic() - gp.play_started_at))
-                except Exception:
-                    elapsed = 0
-            def fmt(s: int) -> str:
-                h, rem = divmod(s, 3600)
-                m, s = divmod(rem, 60)
-                return f"{h}:{m:02d}:{s:02d}" if h else f"{m}:{s:02d}"
-            ts = f"[{fmt(min(elapsed, t.duration))}/{fmt(t.duration)}]" if t.duration else f"[{fmt(elapsed)}]"
-            sections.append(f"🎵 Now Playing: **{t.title}** {ts} — requested by <@{t.requested_by_id}>\n")
-
-        if pending:
-            up_next_lines = ["**Up next:**"]
-            for idx, it in enumerate(pending[:10], start=1):
-                up_next_lines.append(f"\n{idx}. **{it.title}** — requested by <@{it.requested_by_id}>")
-            sections.append("".join(up_next_lines))
-        else:
-            sections.append("Up next: (empty)")
-
-        await interaction.response.send_message("".join(sections))
+    if qlen <= 10:
+        pages = up_next_pages(list(islice(gp.queue, 10)), per_page=10)
+        await interaction.response.send_message(render_queue(np_snapshot(gp), pages[0] if pages else None))
         return
 
-    # Many items: use paginator view
-    view = QueuePaginator(requester_id=interaction.user.id, now_playing=gp.now_playing, play_started_at=gp.play_started_at, pending=pending, per_page=10, timeout=180)
+    # Many items: use paginator view. It outlives this call while the queue keeps changing, so give it a snapshot
+    pending: List[Track] = list(gp.queue)
+    view = QueuePaginator(requester_id=interaction.user.id, np=np_snapshot(gp), pending=pending, per_page=10, timeout=180)
     await interaction.response.send_message(view._render(), view=view)
 
 @bot.tree.command(name="leave", description="Disconnect the bot from voice")
@@ -919,7 +1166,15 @@ async def leave(interaction: discord.Interaction):
     if gp.voice and gp.voice.is_connected():
         await gp.voice.disconnect(force=True)
         gp.voice = None
-        await update_presence(None)
+        # Don't leave the player loop parked on an empty queue forever
+        if gp.player_task and not gp.player_task.done():
+            gp.player_task.cancel()
+        gp.player_task = None
+        gp.cancel_enqueue()
+        gp.cancel_prefetch()
+        gp.queue.clear()
+        gp.set_now_playing(None)
+        update_presence(None)
         await interaction.response.send_message("👋 Left voice.")
     else:
         await interaction.response.send_message("I'm not in a voice channel.", ephemeral=True)
@@ -929,6 +1184,9 @@ async def leave(interaction: discord.Interaction):
 async def main() -> None:
     if not DISCORD_TOKEN:
         raise SystemExit("DISCORD_TOKEN belum diset. Buat file .env dan isi DISCORD_TOKEN=...")
+    # yt-dlp runs in its own process pool; the default executor serves spotipy calls
+    # (incl. parallel playlist pages) and discord.py's ffmpeg probes
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=BLOCKING_IO_WORKERS))
     async with bot:
         await bot.start(DISCORD_TOKEN)
 
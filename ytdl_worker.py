@@ -0,0 +1,127 @@
+"""yt-dlp extraction that runs inside the bot's worker processes.
+
+Kept apart from bot.py and free of import-time side effects (no Discord client,
+no commands), so the functions submitted to the workers never depend on bot state.
+Everything returned or raised from here must be picklable.
+"""
+import atexit
+import threading
+from typing import Optional, List, Tuple
+
+import yt_dlp
+
+YTDL_OPTS = {
+    # Opus first: FFmpegOpusAudio could pass it straight through, but only at unity volume
+    # (see GuildPlayer._make_source in bot.py); at the current fixed 0.5 it is re-encoded like any other codec
+    "format": "bestaudio[acodec=opus]/bestaudio[ext=m4a]/bestaudio/best",
+    "quiet": True,
+    "noplaylist": True,
+    "default_search": "ytsearch",
+    "source_address": "0.0.0.0",
+    # Use Android client to avoid SABR Missing URL; we also add fallbacks
+    "extractor_args": {"youtube": {"player_client": ["android"]}},
+    "ignore_no_formats_error": True,
+}
+
+# Player clients tried in order; fallbacks help when one hits SABR/403
+YTDL_CLIENTS = ("android", "web", "tv")
+# Options per player client, built once instead of copying YTDL_OPTS on every extraction
+_CLIENT_OPTS = {c: {**YTDL_OPTS, "extractor_args": {"youtube": {"player_client": [c]}}} for c in YTDL_CLIENTS}
+# Flat, lazily-streamed playlist listing (entries carry title/duration, no per-video extraction)
+_FLAT_OPTS = {**YTDL_OPTS, "extract_flat": "in_playlist", "lazy_playlist": True, "noplaylist": False}
+
+# Shared YoutubeDL instances (per player client, plus flat playlist readers),
+# so connection pools & extractor caches stay warm between tracks
+_YDL_POOL: dict[str, yt_dlp.YoutubeDL] = {}
+_YDL_POOL_LOCK = threading.Lock()
+
+def _pooled_ydl(key: str, opts: dict) -> yt_dlp.YoutubeDL:
+    with _YDL_POOL_LOCK:
+        ydl = _YDL_POOL.get(key)
+        if ydl is None:
+            ydl = yt_dlp.YoutubeDL(opts)
+            _YDL_POOL[key] = ydl
+        return ydl
+
+def get_ydl(client: str) -> yt_dlp.YoutubeDL:
+    return _pooled_ydl(client, _CLIENT_OPTS[client])
+
+def get_flat_ydl(limit: int) -> yt_dlp.YoutubeDL:
+    # playlistend is read from the instance params, so keep one instance per limit
+    key = f"flat:{limit}"
+    ydl = _YDL_POOL.get(key)
+    if ydl is None:
+        ydl = _pooled_ydl(key, {**_FLAT_OPTS, "playlistend": limit})
+    return ydl
+
+def _close_ydl_pool() -> None:
+    for ydl in _YDL_POOL.values():
+        try:
+            ydl.close()
+        except Exception:
+            pass
+
+atexit.register(_close_ydl_pool)
+
+def _audio_format_key(f: dict) -> Tuple[int, float]:
+    # Prefer Opus (passthrough-capable at unity volume), then m4a, then the highest audio bitrate
+    abr = f.get("abr") or 0
+    if f.get("acodec") == "opus":
+        return (0, -abr)
+    return (1 if f.get("ext") == "m4a" else 2, -abr)
+
+def _best_audio_url(fmts: List[dict]) -> Optional[str]:
+    # Single pass over audio-only formats; only the best one is needed, no need to sort
+    best_url: Optional[str] = None
+    best_key: Optional[Tuple[int, float]] = None
+    for f in fmts:
+        if f.get("vcodec") not in ("none", None) or f.get("acodec") in ("none", None) or not f.get("url"):
+            continue
+        k = _audio_format_key(f)
+        if best_key is None or k < best_key:
+            best_key, best_url = k, f["url"]
+            if k[0] == 0 and -k[1] >= 128:
+                break  # top-ranked codec at a good bitrate, nothing meaningfully better left
+    return best_url
+
+def extract_once(client: str, target: str, query: str) -> Tuple[str, Optional[str], str, Optional[int]]:
+    # yt-dlp errors hold a logger and a traceback, which can't be pickled back to the bot,
+    # so only the message is sent
+    try:
+        info = get_ydl(client).extract_info(target, download=False)
+    except Exception as e:
+        raise RuntimeError(str(e)) from None
+    if "entries" in info and info["entries"]:
+        info = info["entries"][0]
+    stream_url = info.get("url") or _best_audio_url(info.get("formats") or [])
+    duration = info.get("duration")
+    if duration is not None:
+        try:
+            duration = int(duration)
+        except Exception:
+            duration = None
+    return info.get("title", "Unknown"), stream_url, info.get("webpage_url", info.get("original_url", query)), duration
+
+def extract_playlist(url: str, limit: int) -> List[dict]:
+    # Errors are re-raised as plain RuntimeError, see extract_once
+    try:
+        # playlistend (see get_flat_ydl) already stops yt-dlp at `limit` entries
+        info = get_flat_ydl(limit).extract_info(url, download=False)
+    except Exception as err:
+        raise RuntimeError(str(err)) from None
+    out: List[dict] = []
+    for e in info.get("entries") or []:
+        if not e:
+            continue
+        u = e.get("url") or e.get("id")
+        if not u:
+            continue
+        if not u.startswith("http"):
+            u = f"https://www.youtube.com/watch?v={u}"
+        duration = e.get("duration")
+        try:
+            duration = int(duration) if duration is not None else None
+        except Exception:
+            duration = None
+        out.append({"title": e.get("title") or u, "webpage_url": u, "duration": duration})
+    return out